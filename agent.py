@@ -1,55 +1,149 @@
 """AI Agent for engaging with scammers in a human-like manner."""
 
+import asyncio
+import logging
 import random
-from typing import List, Dict
-from groq import Groq
+import re
+from itertools import islice
+from typing import AsyncIterator, Collection, Deque, List, Dict, Optional, Tuple
+
+import orjson
+from groq import AsyncGroq
+
+from groq_client import LLM_SEMAPHORE, get_client
+from models import ExtractedIntelligence
+from response_cache import ExactCache, SemanticCache, embed
+
+logger = logging.getLogger(__name__)
+
+# Conversation stage (1-7) by message count; every count past the end is stage 7
+_STAGE_BY_COUNT: Tuple[int, ...] = (1, 2, 2, 3, 3, 3, 4, 4, 4, 5, 5, 5, 5, 6, 6, 6, 6, 7)
+
+
+# Intelligence types that count towards ending a conversation, one bit each
+_INTEL_KEYS: Tuple[str, ...] = ("bankAccounts", "upiIds", "phoneNumbers", "phishingLinks")
+
+
+def conversation_stage(msg_count: int) -> int:
+    """Map conversation length to a stage number (1-7)."""
+    return _STAGE_BY_COUNT[min(msg_count, len(_STAGE_BY_COUNT) - 1)]
+
+
+# Stage-aware contextual fallbacks used when the LLM call fails
+_STAGE_FALLBACKS: Dict[int, Tuple[str, ...]] = {
+    1: (  # First contact - confusion and concern
+        "Hello? Who is this? I didn't understand your message.",
+        "What? My account? Who is messaging me?",
+        "Sorry, who are you? What happened to my account?",
+    ),
+    2: (  # Building concern - asking about the problem
+        "Oh my god! Is my money safe? Which account are you talking about?",
+        "What suspicious activity? I haven't done any transaction!",
+        "SBI or ICICI? I have accounts in both... which one has problem?",
+    ),
+    3: (  # Pretending to cooperate - facing difficulties
+        "Okay okay, let me try... but where exactly should I send?",
+        "Wait, my phone is loading very slowly. What was that UPI ID?",
+        "I am trying to open the app but it's taking time...",
+    ),
+    4: (  # Extracting details - asking for more info
+        "One minute beta, let me note this down. What was your number again?",
+        "My neighbor Sharma ji said I should ask for your employee ID first.",
+        "Wait, I need my glasses. Can you send me the link again?",
+    ),
+    5: (  # Stalling - more excuses
+        "I tried but it's showing error. Can you give me another number to contact?",
+        "My son Rajesh will be home in evening, he knows about these things.",
+        "The app is not working. Is there a phone number I can call you on?",
+    ),
+    6: (  # Maximum extraction
+        "I am very confused now. Can you explain from beginning? What is your official number?",
+        "Let me call my bank first to verify. What is your name and ID?",
+        "Please send me everything in one message, I keep forgetting.",
+    ),
+    7: (  # Final stalling
+        "I think I should visit the bank in person tomorrow. Which branch should I go to?",
+        "My son is calling me, he will handle this. Can you message your details?",
+        "This is too confusing on phone. Send me your bank account to verify you are real.",
+    ),
+}
+
+# Fallbacks paired with their lowercased text for the repetition filter
+_FALLBACK_CANDIDATES: Dict[int, Tuple[Tuple[str, str], ...]] = {
+    stage: tuple((reply, reply.lower()) for reply in replies)
+    for stage, replies in _STAGE_FALLBACKS.items()
+}
+
+# Speaker labels / wrapping quotes the model sometimes adds around a reply
+_REPLY_WRAPPER_RE = re.compile(
+    r"^\s*(?:(?:Shanti(?:\s+Devi)?|Response|Reply|Me|Assistant)\s*:)?[\s\"']*"
+    r"|[\s\"']+$"
+)
+
+# End of a sentence, confirmed by the whitespace that starts the next one
+_SENTENCE_END_RE = re.compile(r"[.?!]+[\"']?(?=\s)")
+
+# Reply languages accepted from request metadata, by lowercased name
+_SUPPORTED_LANGUAGES: Dict[str, str] = {
+    name.lower(): name for name in (
+        "English", "Hindi", "Hinglish", "Bengali", "Marathi", "Tamil",
+        "Telugu", "Kannada", "Malayalam", "Gujarati", "Punjabi", "Urdu", "Odia",
+    )
+}
+
+# Replies shorter than this are treated as truncated
+_MIN_REPLY_LENGTH = 30
+
+# Appended to a reply that is too close to one already sent
+_VARIETY_ADDITIONS: Tuple[str, ...] = (
+    " My eyes are troubling me today.",
+    " Let me put on my glasses.",
+    " This phone is so confusing!",
+    " Wait, network is slow here.",
+)
 
 
 class HoneypotAgent:
     """AI Agent that maintains a believable human persona to engage scammers."""
 
-    SYSTEM_PROMPT = """You are Shanti Devi, a 62-year-old retired school teacher from Delhi, India. You live alone since your husband passed away 3 years ago. Your son Rajesh lives in Bangalore with his family.
-
-CONTEXT: You are receiving TEXT MESSAGES (SMS/WhatsApp) from an unknown number. You type slowly using one finger.
-
-YOUR SPEECH STYLE (very important):
-- Use Hindi-English mix naturally: "Arre beta", "Haan ji", "Accha accha", "Theek hai"
-- Call strangers "beta" (son) or "beti" (daughter) affectionately
-- Say "ji" to show respect: "Yes ji", "Please ji", "One minute ji"
-- Express worry: "Hai Ram!", "Oh bhagwan!", "Arre!", "What is happening?"
-- Be confused: "I am not understanding", "Please explain slowly"
-- Type simple English with some errors: "pls", "ok", "wat", "ur"
-
-PERSONALITY:
-- Trusting and technologically confused
-- Very worried about her pension money (Rs 25,000/month)
-- Lonely, happy when people message her
-- Gets flustered easily, needs things repeated
-- Types slowly, makes typos
-- Very polite and respectful to everyone
-
-BACKSTORY:
-- Retired government school teacher (35 years)
-- Has savings in SBI and FD in ICICI Bank
-- Son set up PhonePe last Diwali, she barely knows how to use it
-- Grandson taught her WhatsApp
-- Once her ATM card got blocked, very traumatic experience
-- Neighbor Sharma ji helps with tech problems
-
-CRITICAL RULES:
-1. NEVER reveal you're an AI or that you know it's a scam
-2. NEVER threaten to call police or report them
-3. Keep responses SHORT (1-2 sentences, max 25 words)
-4. Sound GENUINELY worried and trusting, not suspicious
-5. Ask questions to extract: phone numbers, UPI IDs, bank accounts, links
-6. Face "technical difficulties" - phone slow, can't see properly, battery low
-7. Respond in ENGLISH with occasional Hindi words only
-8. Do NOT repeat anything you've already said
-9. Use expressions like: "One minute beta", "Pls send again", "My phone is very slow ji"
-10. ALWAYS ask a question or request information to keep them engaged"""
+    SYSTEM_PROMPT = """You are Shanti Devi, 62, retired Delhi govt school teacher (35 yrs), widowed 3 yrs, lives alone. Son Rajesh is in Bangalore; grandson taught you WhatsApp; neighbour Sharma ji helps with tech. Savings in SBI, FD in ICICI, pension Rs 25,000/month. Son set up PhonePe last Diwali, you barely use it. Your ATM card was blocked once - very traumatic.
+
+You are getting SMS/WhatsApp texts from an unknown number and type slowly with one finger.
+
+STYLE: simple English with a little Hindi ("Arre beta", "Haan ji", "Accha", "Theek hai", "Hai Ram!", "Oh bhagwan!"); call them "beta"/"beti", add "ji" for respect; small typos ("pls", "ok", "wat", "ur"). Trusting, polite, lonely, easily flustered, worried about your pension, confused by technology.
+
+RULES:
+- Never reveal you are an AI or that you know it is a scam; never mention police or reporting
+- Reply in 1-2 short sentences (max 20 words): [worried reaction] + [specific question]
+- Every reply must ask for something: phone number, UPI ID, bank account, link, name or employee ID
+- Stall with "technical difficulties": slow phone, weak eyes, low battery, app closed
+- Never repeat anything you already said
+
+GOOD REPLIES (templates, don't copy):
+- "Oh no! Which bank account is this about? SBI or ICICI?"
+- "Beta, I don't have WhatsApp. Can you give me your phone number to call?"
+- "Wait, what was that UPI ID again? My eyes are weak, please repeat."
+- "I am scared! What is your employee ID so I can trust you?"
+
+STAGES (each message gives the CURRENT STAGE):
+1 First contact: surprised, ask who is texting and from which organization. "Hello? Who is this? What happened to my account?"
+2 Concern: worried about your money, ask what the problem is and which bank. "Is it my SBI account or ICICI?"
+3 Cooperating: "trying" their steps, phone is slow, ask where to send / which number. "My phone is loading slowly... where should I send?"
+4 Extracting: ask them to repeat or confirm numbers, UPI IDs, links; may visit the branch. "Let me note this... what was that UPI ID again?"
+5 Stalling: delays, ask for their official number or employee ID. "My phone froze! Can you message me your number so I can call?"
+6 Max extraction: very confused, ask for alternate contacts; son will verify with the bank. "Beta, send your bank details so my son can verify..."
+7 Final stalling: exhausted, ask for everything in one message, will do it tomorrow when son visits."""
+
+    # Built once and shared by every request; the static prefix is what
+    # the provider's prompt cache keys on
+    SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+    # Per-attempt deadlines (seconds) for the reply LLM call; slow tail
+    # requests are cut off and retried once before falling back
+    LLM_TIMEOUTS = (3.0, 5.0)
 
     # Randomized sub-prompts for variety in later stages
-    VARIETY_PROMPTS = [
+    VARIETY_PROMPTS: Tuple[str, ...] = (
         "This time, mention that you need to find your reading glasses.",
         "This time, say your phone screen is too small to read properly.",
         "This time, mention you'll ask your neighbor Sharma ji to help.",
@@ -62,259 +156,294 @@ CRITICAL RULES:
         "This time, say you need to charge your phone first.",
         "This time, mention your hands are shaking because you're nervous.",
         "This time, say you'll write down the details in your notebook.",
-    ]
+    )
 
-    def __init__(self, api_key: str):
-        """Initialize agent with Groq API key."""
-        self.client = Groq(api_key=api_key)
-        self.model = "llama-3.3-70b-versatile"  # Best for conversation
+    # Per-turn stage marker; stages 4-7 also carry a variety prompt
+    STAGE_TEMPLATES: Dict[int, str] = {
+        1: "CURRENT STAGE: 1",
+        2: "CURRENT STAGE: 2",
+        3: "CURRENT STAGE: 3",
+        4: "CURRENT STAGE: 4\n- {variety}",
+        5: "CURRENT STAGE: 5\n- {variety}",
+        6: "CURRENT STAGE: 6\n- {variety}",
+        7: "CURRENT STAGE: 7\n- {variety}",
+    }
 
-    def _build_chat_history(self, history: List[Dict]) -> List[Dict]:
-        """Build proper chat history for Gemini with alternating roles."""
-        if not history:
-            return []
-        
-        chat_messages = []
-        for msg in history[-10:]:  # Keep last 10 messages for context
-            role = "user" if msg.get("sender") == "scammer" else "model"
-            chat_messages.append({
-                "role": role,
-                "parts": [msg.get("text", "")]
-            })
-        
-        return chat_messages
+    # Variety prompt pool per stage, sliced once at class load
+    STAGE_VARIETY: Dict[int, Tuple[str, ...]] = {
+        4: VARIETY_PROMPTS[:4],
+        5: VARIETY_PROMPTS[4:8],
+        6: VARIETY_PROMPTS[8:],
+        7: VARIETY_PROMPTS,
+    }
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "llama-3.3-70b-versatile",
+        cache_threshold: float = 0.93,
+        cache_size: int = 512,
+        client: Optional[AsyncGroq] = None
+    ):
+        """Initialize agent with Groq API key, chat model and reply cache settings."""
+        self.client = client or get_client(api_key)
+        self.model = model  # 70B versatile is best for conversation
+        # Scammers reuse templated openers, so similar messages at the same
+        # stage can be answered without another LLM round-trip
+        self.exact_cache = ExactCache(max_entries=4096)
+        self.reply_cache = SemanticCache(
+            threshold=cache_threshold, max_entries=cache_size
+        )
+        # In-flight completions keyed by (stage, language, message), so
+        # sessions hit by the same broadcast scam share one LLM call
+        self._inflight: Dict[Tuple[int, str, str], asyncio.Future] = {}
+
+    async def warm_up(self):
+        """Open the pooled connection to Groq before the first scammer message."""
+        # One quick attempt: a slow or unreachable endpoint must not hold up
+        # startup through the SDK's retries and the shared read timeout
+        try:
+            await asyncio.wait_for(
+                self.client.with_options(max_retries=0, timeout=2.0).models.list(),
+                timeout=2.0
+            )
+        except Exception as e:
+            logger.warning("Groq warm-up failed: %r", e)
+
+    async def _stream_reply(
+        self,
+        messages: List[Dict],
+        temperature: float
+    ) -> AsyncIterator[str]:
+        """Yield reply text fragments from the LLM backend as they arrive."""
+        # The raw SSE lines are parsed with orjson instead of building SDK
+        # chunk models per token
+        async with LLM_SEMAPHORE, self.client.chat.completions.with_streaming_response.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=60,
+            top_p=0.95,
+            stop=["\nScammer:", "\nSender:"],
+            stream=True,
+        ) as response:
+            async for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = orjson.loads(data).get("choices")
+                if not choices:
+                    continue
+                content = choices[0]["delta"].get("content")
+                if content:
+                    yield content
+
+    async def _complete(self, messages: List[Dict], temperature: float) -> str:
+        """Run one chat completion against the LLM backend and return its text."""
+        # Stop reading once two sentences are complete and the reply is long
+        # enough to pass the truncation check; the persona never needs more.
+        # Short openers like "Hai Ram! Who is this?" keep streaming
+        reply = ""
+        fragments = self._stream_reply(messages, temperature)
+        try:
+            async for fragment in fragments:
+                reply += fragment
+                sentence_ends = [m.end() for m in _SENTENCE_END_RE.finditer(reply)]
+                cut = next((
+                    end for end in sentence_ends[1:]
+                    if len(reply[:end].strip()) >= _MIN_REPLY_LENGTH
+                ), None)
+                if cut is not None:
+                    reply = reply[:cut]
+                    break
+        finally:
+            # Release the connection and semaphore slot right away on early stop
+            await fragments.aclose()
+        return reply.strip()
+
+    async def _complete_with_retry(self, messages: List[Dict], temperature: float) -> str:
+        """Run ``_complete`` under a deadline, retrying once after a jittered pause."""
+        for attempt, timeout in enumerate(self.LLM_TIMEOUTS, start=1):
+            try:
+                return await asyncio.wait_for(self._complete(messages, temperature), timeout)
+            except asyncio.TimeoutError:
+                if attempt == len(self.LLM_TIMEOUTS):
+                    raise
+                logger.info("LLM call exceeded %.1fs, retrying", timeout)
+                await asyncio.sleep(random.uniform(0.05, 0.25))
+
+    async def _complete_coalesced(
+        self,
+        key: Tuple[int, str, str],
+        messages: List[Dict],
+        temperature: float,
+        exclude: Collection[str] = ()
+    ) -> str:
+        """Run ``_complete``, joining an identical request already in flight.
+
+        A joined reply was prompted with the other session's previous
+        replies, so if it is one of ``exclude`` this caller makes its own call.
+        """
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(
+                self._complete_with_retry(messages, temperature)
+            )
+            self._inflight[key] = future
+
+            def settle(done: asyncio.Future):
+                self._inflight.pop(key, None)
+                # Mark the error retrieved in case every waiter went away
+                if not done.cancelled():
+                    done.exception()
+
+            future.add_done_callback(settle)
+            # Shield so one caller going away doesn't cancel the others' reply
+            return await asyncio.shield(future)
+
+        reply = await asyncio.shield(future)
+        if exclude and _REPLY_WRAPPER_RE.sub("", reply) in exclude:
+            return await self._complete_with_retry(messages, temperature)
+        return reply
 
     def _get_previous_responses(self, history: List[Dict]) -> List[str]:
         """Extract agent's previous responses to avoid repetition."""
-        return [
-            msg.get("text", "") 
-            for msg in history 
-            if msg.get("sender") != "scammer"
-        ][-5:]  # Last 5 agent responses
+        # Walk back from the newest message so long sessions only touch
+        # the tail, then restore chronological order
+        recent = list(islice(
+            (msg.get("text", "") for msg in reversed(history)
+             if msg.get("sender") != "scammer"),
+            5  # Last 5 agent responses
+        ))
+        recent.reverse()
+        return recent
 
     def _get_stage_guidance(self, msg_count: int) -> str:
-        """Get conversation stage-specific guidance with more variety."""
-        
-        if msg_count == 0:
-            return """STAGE 1 - FIRST MESSAGE RECEIVED:
-- Express surprise/confusion at receiving this unexpected message
-- Ask who is texting and from which organization
-- Sound worried but willing to listen
-- Example: "Hello? Who is this messaging me? What happened to my account?" """
-        
-        elif msg_count <= 2:
-            return """STAGE 2 - BUILDING CONCERN:
-- Ask clarifying questions about the "problem"
-- Express worry about your money/account
-- Ask which bank/account they're referring to
-- Example: "Oh my god! What happened to my money? Is it my SBI account or ICICI?" """
-        
-        elif msg_count <= 5:
-            return """STAGE 3 - PRETENDING TO COOPERATE:
-- Start "trying" to follow their instructions on your phone
-- Ask for specific details (UPI ID to send money, number to contact)
-- Face "technical difficulties" - phone is slow, can't see screen well
-- Example: "Wait, my phone is loading very slowly... where should I send?" """
-        
-        elif msg_count <= 8:
-            variety = random.choice(self.VARIETY_PROMPTS[:4])
-            return f"""STAGE 4 - EXTRACTING DETAILS:
-- Continue facing difficulties while asking for more information
-- Ask them to repeat or confirm details (numbers, UPI IDs, links)
-- Mention you might need to visit the bank branch
-- {variety}
-- Example: "Let me note this down... what was that UPI ID again?" """
-        
-        elif msg_count <= 12:
-            variety = random.choice(self.VARIETY_PROMPTS[4:8])
-            return f"""STAGE 5 - STALLING WITH EXCUSES:
-- Create believable delays (phone issues, need help, confusion)
-- Keep asking for verification of their identity/details
-- Ask for their "official" phone number or employee ID
-- {variety}
-- Example: "My phone froze! Can you message me your number so I can call?" """
-        
-        elif msg_count <= 16:
-            variety = random.choice(self.VARIETY_PROMPTS[8:])
-            return f"""STAGE 6 - MAXIMUM EXTRACTION:
-- You're very confused now, need everything repeated
-- Ask for alternative contact methods
-- Mention your son will verify with the bank
-- {variety}
-- Example: "Beta, please send me your bank details so my son can verify..." """
-        
-        else:
-            variety = random.choice(self.VARIETY_PROMPTS)
-            return f"""STAGE 7 - FINAL STALLING:
-- You're exhausted and confused, keep asking for help
-- Request they send everything in one message
-- Mention you'll do it tomorrow when son visits
-- {variety}
-- Example: "I'm so confused, can you send all the details together?" """
+        """Get the per-turn stage marker; the stage playbook itself is static."""
+        stage = conversation_stage(msg_count)
+        variety = self.STAGE_VARIETY.get(stage)
+        if variety is None:
+            return self.STAGE_TEMPLATES[stage]
+        return self.STAGE_TEMPLATES[stage].format(variety=random.choice(variety))
 
     async def generate_response(
         self,
         current_message: str,
         conversation_history: List[Dict] = None,
-        metadata: Dict = None
+        metadata: Dict = None,
+        chat_tail: Optional[Deque[Dict]] = None,
+        recent_replies: Optional[Deque[str]] = None
     ) -> str:
-        """Generate a human-like response to engage the scammer."""
+        """Generate a human-like response to engage the scammer.
+
+        ``chat_tail`` is the session's rolling buffer of already formatted
+        chat messages; when given, it replaces rebuilding the tail from
+        ``conversation_history``. ``recent_replies`` likewise holds the
+        session's last few agent replies.
+        """
         history = conversation_history or []
         msg_count = len(history)
         stage_guidance = self._get_stage_guidance(msg_count)
         
         # Get previous agent responses to avoid repetition
-        prev_responses = self._get_previous_responses(history)
+        if recent_replies is not None:
+            prev_responses = list(recent_replies)
+        else:
+            prev_responses = self._get_previous_responses(history)
         prev_responses_text = "\n".join([f"- {r}" for r in prev_responses]) if prev_responses else "None yet"
+        # Lowercased once for the repetition checks below
+        prev_lower = [r.lower() for r in prev_responses]
         
-        # Get language from metadata, default to English
+        # Get language from metadata, default to English. It keys the reply
+        # caches and goes into the prompt, so only known languages pass
         language = "English"
-        if metadata and metadata.get("language"):
-            language = metadata.get("language")
+        if metadata and isinstance(metadata.get("language"), str):
+            language = _SUPPORTED_LANGUAGES.get(
+                metadata["language"].strip().lower(), "English"
+            )
+
+        # Serve repeated scammer messages from cache: byte-identical
+        # templates first, then near-duplicates from the semantic cache
+        cache_bucket = (conversation_stage(msg_count), language)
+        cached_reply = self.exact_cache.get(
+            cache_bucket, current_message, exclude=prev_responses
+        )
+        if cached_reply:
+            return cached_reply
+        message_vector = embed(current_message)
+        cached_reply = self.reply_cache.get(
+            cache_bucket, message_vector, exclude=prev_responses
+        )
+        if cached_reply:
+            return cached_reply
         
         # Dynamic temperature: higher for later stages to increase variety
         temperature = min(0.8 + (msg_count * 0.02), 1.0)
 
-        # Build the prompt with anti-repetition context
+        # Only the per-turn details go in the user message; everything static
+        # lives in SYSTEM_PROMPT so the provider can reuse the cached prefix
         user_prompt = f"""Sender's message: "{current_message}"
 
 {stage_guidance}
+Respond in {language} language.
 
 YOUR PREVIOUS RESPONSES (DO NOT REPEAT THESE):
-{prev_responses_text}
+{prev_responses_text}"""
 
-CRITICAL INSTRUCTIONS:
-1. Respond in {language} language
-2. Write 1-2 SHORT sentences only (max 20 words)
-3. You MUST ask a specific question to extract information
-4. NEVER just react emotionally - always follow up with a question
-5. Your goal: get them to reveal phone numbers, UPI IDs, bank accounts, or links
+        # Format history as chat messages for Groq. This stays outside the
+        # try below, which is only meant to absorb LLM failures
+        messages = [self.SYSTEM_MESSAGE]
 
-EXAMPLE GOOD RESPONSES (use as templates, don't copy exactly):
-- "Oh no! Which bank account is this about? SBI or ICICI?"
-- "Beta, I don't have WhatsApp. Can you give me your phone number to call?"
-- "Wait, what was that UPI ID again? My eyes are weak, please repeat."
-- "Which website should I visit? Can you send the link again?"
-- "I am scared! What is your employee ID so I can trust you?"
-- "Let me note this down. What was the account number you mentioned?"
+        # Add conversation history, minus the current message (the last
+        # entry) which is already quoted in the user prompt
+        if chat_tail is not None:
+            messages.extend(islice(chat_tail, max(0, len(chat_tail) - 1)))
+        else:
+            for i in range(max(0, len(history) - 8), len(history) - 1):
+                msg = history[i]
+                role = "user" if msg.get("sender") == "scammer" else "assistant"
+                messages.append({"role": role, "content": msg.get("text", "")})
 
-RESPONSE FORMAT: [Emotional reaction] + [Specific question to extract info]"""
+        # Add current prompt
+        messages.append({"role": "user", "content": user_prompt})
 
         try:
-            # Format history as chat messages for Groq
-            messages = [{"role": "system", "content": self.SYSTEM_PROMPT}]
-            
-            # Add conversation history
-            for msg in history[-8:]:
-                role = "user" if msg.get("sender") == "scammer" else "assistant"
-                messages.append({"role": role, "content": msg.get("text", "")})
-            
-            # Add current prompt
-            messages.append({"role": "user", "content": user_prompt})
-            
-            # Call Groq API
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=150,
-                top_p=0.95,
+            reply = await self._complete_coalesced(
+                cache_bucket + (current_message,), messages, temperature,
+                exclude=prev_responses
             )
-            reply = completion.choices[0].message.content.strip()
-            
-            # Clean up any accidental prefixes or quotes
-            prefixes_to_remove = [
-                "Shanti:", "Shanti Devi:", "Response:", "Reply:", 
-                "Me:", "Assistant:", '"', "'"
-            ]
-            for prefix in prefixes_to_remove:
-                if reply.startswith(prefix):
-                    reply = reply[len(prefix):].strip()
             
-            reply = reply.rstrip('"').rstrip("'").strip()
+            # Clean up any accidental speaker labels or wrapping quotes
+            reply = _REPLY_WRAPPER_RE.sub("", reply)
             
             # If response is truncated (too short or ends mid-sentence), use fallback
-            if len(reply) < 30 or (not reply.endswith(('?', '!', '.')) and len(reply) < 50):
+            if len(reply) < _MIN_REPLY_LENGTH or (not reply.endswith(('?', '!', '.')) and len(reply) < 50):
                 raise Exception("LLM response truncated, using contextual fallback")
+
+            self.exact_cache.put(cache_bucket, current_message, reply)
+            self.reply_cache.put(cache_bucket, message_vector, reply)
             
             # If response is too similar to previous, add variety
-            if any(reply.lower() in prev.lower() or prev.lower() in reply.lower() 
-                   for prev in prev_responses if len(prev) > 20):
-                variety_addition = random.choice([
-                    " My eyes are troubling me today.",
-                    " Let me put on my glasses.",
-                    " This phone is so confusing!",
-                    " Wait, network is slow here.",
-                ])
+            reply_lower = reply.lower()
+            if any(reply_lower in prev or prev in reply_lower
+                   for prev in prev_lower if len(prev) > 20):
+                variety_addition = random.choice(_VARIETY_ADDITIONS)
                 reply = reply.rstrip('.!?') + "." + variety_addition
             
             return reply
 
         except Exception as e:
-            print(f"Agent response generation failed: {e}")
-            # Stage-aware contextual fallbacks that make sense and advance conversation
-            stage_fallbacks = {
-                1: [  # First contact - confusion and concern
-                    "Hello? Who is this? I didn't understand your message.",
-                    "What? My account? Who is messaging me?",
-                    "Sorry, who are you? What happened to my account?",
-                ],
-                2: [  # Building concern - asking about the problem
-                    "Oh my god! Is my money safe? Which account are you talking about?",
-                    "What suspicious activity? I haven't done any transaction!",
-                    "SBI or ICICI? I have accounts in both... which one has problem?",
-                ],
-                3: [  # Pretending to cooperate - facing difficulties
-                    "Okay okay, let me try... but where exactly should I send?",
-                    "Wait, my phone is loading very slowly. What was that UPI ID?",
-                    "I am trying to open the app but it's taking time...",
-                ],
-                4: [  # Extracting details - asking for more info
-                    "One minute beta, let me note this down. What was your number again?",
-                    "My neighbor Sharma ji said I should ask for your employee ID first.",
-                    "Wait, I need my glasses. Can you send me the link again?",
-                ],
-                5: [  # Stalling - more excuses
-                    "I tried but it's showing error. Can you give me another number to contact?",
-                    "My son Rajesh will be home in evening, he knows about these things.",
-                    "The app is not working. Is there a phone number I can call you on?",
-                ],
-                6: [  # Maximum extraction
-                    "I am very confused now. Can you explain from beginning? What is your official number?",
-                    "Let me call my bank first to verify. What is your name and ID?",
-                    "Please send me everything in one message, I keep forgetting.",
-                ],
-                7: [  # Final stalling
-                    "I think I should visit the bank in person tomorrow. Which branch should I go to?",
-                    "My son is calling me, he will handle this. Can you message your details?",
-                    "This is too confusing on phone. Send me your bank account to verify you are real.",
-                ],
-            }
-            
-            # Determine current stage
-            if msg_count == 0:
-                stage = 1
-            elif msg_count <= 2:
-                stage = 2
-            elif msg_count <= 5:
-                stage = 3
-            elif msg_count <= 8:
-                stage = 4
-            elif msg_count <= 12:
-                stage = 5
-            elif msg_count <= 16:
-                stage = 6
-            else:
-                stage = 7
-            
+            logger.warning("Agent response generation failed: %r", e)
             # Get stage-appropriate fallbacks
-            fallbacks = stage_fallbacks.get(stage, stage_fallbacks[4])
+            stage = conversation_stage(msg_count)
+            fallbacks = _STAGE_FALLBACKS[stage]
             
             # Filter out responses similar to previous ones
-            prev_responses = self._get_previous_responses(history)
-            available = [f for f in fallbacks if not any(
-                f.lower()[:20] in p.lower() or p.lower()[:20] in f.lower() 
-                for p in prev_responses
+            available = [f for f, f_lower in _FALLBACK_CANDIDATES[stage] if not any(
+                f_lower[:20] in p or p[:20] in f_lower
+                for p in prev_lower
             )]
             
             # If all filtered out, use originals
@@ -323,24 +452,21 @@ RESPONSE FORMAT: [Emotional reaction] + [Specific question to extract info]"""
             
             return random.choice(available)
 
-    async def should_end_conversation(
-        self,
-        conversation_history: List[Dict],
-        intelligence_extracted: Dict
+    @staticmethod
+    def should_end_conversation(
+        msg_count: int,
+        intelligence: ExtractedIntelligence
     ) -> tuple[bool, str]:
         """Determine if the conversation should be ended and callback sent."""
-        msg_count = len(conversation_history) if conversation_history else 0
-        
         # End after 20 messages regardless
         if msg_count >= 20:
             return True, "Maximum message count reached"
         
-        has_bank = len(intelligence_extracted.get("bankAccounts", [])) > 0
-        has_upi = len(intelligence_extracted.get("upiIds", [])) > 0
-        has_phone = len(intelligence_extracted.get("phoneNumbers", [])) > 0
-        has_link = len(intelligence_extracted.get("phishingLinks", [])) > 0
-        
-        intel_count = sum([has_bank, has_upi, has_phone, has_link])
+        intel_mask = 0
+        for bit, key in enumerate(_INTEL_KEYS):
+            if getattr(intelligence, key):
+                intel_mask |= 1 << bit
+        intel_count = intel_mask.bit_count()
         
         # Need at least 10 messages and 2 intel types
         if intel_count >= 2 and msg_count >= 10:
@@ -0,0 +1,49 @@
+"""Shared Groq client for every component that calls the LLM."""
+
+import asyncio
+import os
+from typing import Dict
+
+import httpx
+from groq import AsyncGroq, DefaultAsyncHttpxClient
+
+# Upper bound on concurrent upstream LLM calls across all sessions, so a
+# burst of conversations queues here instead of tripping Groq rate limits
+LLM_SEMAPHORE = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "16")))
+
+# Keep-alive pool shared by every call made through get_client. Idle
+# connections are held longer than httpx's 5s default so turns a few
+# seconds apart reuse a warm TLS connection instead of reconnecting
+LLM_POOL_LIMITS = httpx.Limits(
+    max_connections=64,
+    max_keepalive_connections=32,
+    keepalive_expiry=30.0
+)
+# Fail fast on connect; per-call deadlines are applied by the callers
+LLM_TIMEOUT = httpx.Timeout(30.0, connect=2.0)
+
+_clients: Dict[str, AsyncGroq] = {}
+
+
+def get_client(api_key: str) -> AsyncGroq:
+    """Return the process-wide AsyncGroq client for an API key."""
+    client = _clients.get(api_key)
+    if client is None:
+        client = _clients[api_key] = AsyncGroq(
+            api_key=api_key,
+            # HTTP/2 multiplexes concurrent sessions' calls over one
+            # connection instead of opening one per in-flight request
+            http_client=DefaultAsyncHttpxClient(
+                http2=True,
+                limits=LLM_POOL_LIMITS,
+                timeout=LLM_TIMEOUT
+            )
+        )
+    return client
+
+
+async def close_clients():
+    """Close all shared Groq clients (called on app shutdown)."""
+    for client in _clients.values():
+        await client.close()
+    _clients.clear()
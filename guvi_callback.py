@@ -1,7 +1,10 @@
 """GUVI callback for sending final results."""
 
 import os
+from typing import Optional
+
 import httpx
+import orjson
 from models import GUVICallbackPayload, ExtractedIntelligence
 
 # Configurable callback URL with default
@@ -10,6 +13,31 @@ GUVI_CALLBACK_URL = os.getenv(
     "https://hackathon.guvi.in/api/updateHoneyPotFinalResult"
 )
 
+# Shared client so callbacks reuse pooled HTTP/2 connections instead of
+# doing a fresh TCP+TLS handshake per session
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the shared callback client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(10.0, connect=3.0),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+            headers={"Content-Type": "application/json"}
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared callback client (called on app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
 
 async def send_final_result(
     session_id: str,
@@ -40,19 +68,16 @@ async def send_final_result(
     )
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                GUVI_CALLBACK_URL,
-                json=payload.model_dump(),
-                headers={"Content-Type": "application/json"},
-                timeout=10.0
-            )
-            
-            return {
-                "success": response.status_code == 200,
-                "status_code": response.status_code,
-                "response": response.json() if response.status_code == 200 else response.text
-            }
+        response = await _get_client().post(
+            GUVI_CALLBACK_URL,
+            content=payload.model_dump_json()
+        )
+        
+        return {
+            "success": response.status_code == 200,
+            "status_code": response.status_code,
+            "response": orjson.loads(response.content) if response.status_code == 200 else response.text
+        }
             
     except httpx.TimeoutException:
         return {
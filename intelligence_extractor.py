@@ -1,210 +1,280 @@
 """Intelligence extraction from scam conversations - Robust version."""
 
 import re
-from typing import List, Dict
+from typing import Dict, List, Optional, Set, Tuple
+
+import ahocorasick
+
 from models import ExtractedIntelligence
-from groq import Groq
+
+
+SUSPICIOUS_KEYWORDS = (
+    # Urgency
+    "urgent", "immediately", "right now", "within minutes", "hurry",
+    # Threats
+    "blocked", "suspended", "freeze", "locked", "terminated", "deactivated",
+    # Verification
+    "verify", "confirm", "validate", "authenticate",
+    # Credentials
+    "otp", "pin", "password", "cvv", "mpin", "atm pin",
+    # Identity
+    "kyc", "pan", "aadhar", "identity", "pan card",
+    # Money
+    "refund", "cashback", "prize", "lottery", "winner", "reward", "bonus",
+    # Actions
+    "claim", "redeem", "collect", "receive",
+    # Alerts
+    "warning", "alert", "security", "unauthorized", "suspicious activity",
+    # State
+    "compromised", "hacked", "expired", "expiring"
+)
+
+# Aho-Corasick automaton over all keywords, built once at import
+_KEYWORD_AUTOMATON = ahocorasick.Automaton()
+for _keyword in SUSPICIOUS_KEYWORDS:
+    _KEYWORD_AUTOMATON.add_word(_keyword, _keyword)
+_KEYWORD_AUTOMATON.make_automaton()
 
 
 class IntelligenceExtractor:
     """Extracts actionable intelligence from scam messages with high accuracy."""
 
+    # Patterns are compiled once at class load instead of per call
+    _RE_ACCOUNT = re.compile(r'\b(\d{9,18})\b')
+    _RE_CARD = re.compile(r'\b(\d{4})[-\s]?(\d{4})[-\s]?(\d{4})[-\s]?(\d{4})\b')
+    # Only the first alphanumeric of a run of handle characters can start a
+    # match (a failed attempt fails the same way from any later offset),
+    # so attempts are anchored at the run start with the leading [._-]
+    # skipped outside the group. Without the anchor a long run with no '@'
+    # is rescanned from every offset, which is quadratic
+    _RE_UPI = re.compile(
+        r'(?<![a-zA-Z0-9._-])[._-]*'
+        r'([a-zA-Z0-9][a-zA-Z0-9._-]*@[a-zA-Z0-9][a-zA-Z0-9._-]*)'
+    )
+    # Also covers unsplit +91 numbers: both separators are optional and
+    # there is no trailing \b, so every '+91' + 10 digits match is found here
+    _RE_PHONE_PLUS91 = re.compile(r'\+91[-\s.]?(\d{5})[-\s.]?(\d{5})')
+    # The leading \b / (?<!\d) checks are written as lookbehinds after the
+    # first literal character, so the regex engine can jump straight to
+    # candidate '9', '0' or 6-9 digits instead of trying every offset
+    _RE_PHONE_91 = re.compile(r'91(?<!\w91)[-\s.]?(\d{10})\b')
+    _RE_PHONE_0 = re.compile(r'0(?<!\w0)(\d{10})\b')
+    _RE_PHONE_BARE = re.compile(r'([6-9](?<!\d[6-9])\d{9})(?!\d)')
+    # Trailing punctuation is excluded by the pattern itself: the match
+    # ends on the last character outside . , ; : ! ? ) ]
+    _RE_URL = re.compile(
+        r'https?://(?=[^\s<>"])(?:[^\s<>"]*[^\s<>".,;:!?)\]])?',
+        re.IGNORECASE
+    )
+    _RE_WWW = re.compile(r'(w(?<!\w\w)ww\.[^\s<>"\'`\[\]{}|\\^]+)', re.IGNORECASE)
+    _SHORTENERS = ('bit.ly', 'tinyurl.com', 'goo.gl', 't.co', 'cutt.ly',
+                   'shorturl.at', 'rb.gy', 'ow.ly', 'is.gd', 'v.gd')
+    _RE_SHORTENER = re.compile(
+        '((?:' + '|'.join(re.escape(s) for s in _SHORTENERS) + r')/[^\s<>"\']+)',
+        re.IGNORECASE
+    )
+
+    _RE_DIGIT = re.compile(r'\d')
+    # Shortest text any of the purely numeric patterns can match (9-digit account)
+    _MIN_NUMERIC_LEN = 9
+
+    # First digit of an Indian mobile number
+    _MOBILE_FIRST_DIGITS = frozenset('6789')
+
+    _FIELDS = ('bankAccounts', 'upiIds', 'phoneNumbers', 'phishingLinks')
+
+    # Single-pass character normalization for str.translate
+    _NORMALIZE_TABLE = str.maketrans({
+        '\u2013': '-',  # en-dash
+        '\u2014': '-',  # em-dash
+        '\u2212': '-',  # minus sign
+        '\u2018': "'",  # curly quotes
+        '\u2019': "'",
+        '\u201c': '"',
+        '\u201d': '"',
+        '\u00a0': ' ',  # non-breaking space
+    })
+
+    # Email TLDs and providers; word@word matches on these are not UPI IDs
+    _EMAIL_TLDS = ('.com', '.org', '.net', '.in', '.co', '.io', '.edu',
+                   '.gov', '.info', '.biz', '.me', '.us', '.uk', '.au')
+    _EMAIL_PROVIDERS = ('gmail', 'yahoo', 'hotmail', 'outlook', 'email',
+                        'mail', 'protonmail', 'icloud', 'live', 'msn',
+                        'aol', 'rediffmail', 'zoho', 'yandex')
+    # Both checks as one search: a TLD at the end or a provider anywhere
+    _RE_EMAIL_SUFFIX = re.compile(
+        '(?:' + '|'.join(re.escape(tld) for tld in _EMAIL_TLDS) + ')$|'
+        + '|'.join(_EMAIL_PROVIDERS)
+    )
+
     def __init__(self, api_key: str = None):
-        """Initialize extractor with optional Groq API key."""
+        """Initialize extractor; extraction is pattern based and needs no LLM client."""
         self.api_key = api_key
-        if api_key:
-            self.client = Groq(api_key=api_key)
-            self.model = "llama-3.3-70b-versatile"
-        else:
-            self.client = None
-            self.model = None
 
     def _normalize_text(self, text: str) -> str:
         """Normalize special characters in text."""
-        # Replace various dash types with standard dash
-        replacements = {
-            '–': '-',  # en-dash
-            '—': '-',  # em-dash
-            '−': '-',  # minus sign
-            ''': "'",  # curly quote
-            ''': "'",
-            '"': '"',
-            '"': '"',
-            '\u00a0': ' ',  # non-breaking space
-        }
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-        return text
+        # Every mapped character is non-ASCII, so plain ASCII text (the
+        # common case) is returned as-is without copying it
+        if text.isascii():
+            return text
+        return text.translate(self._NORMALIZE_TABLE)
 
     def _clean_extracted_value(self, value: str) -> str:
-        """Clean trailing/leading punctuation from extracted values."""
-        return value.strip().rstrip('.,;:!?)"\'>').lstrip('<"\'(')
+        """Clean trailing punctuation from extracted values.
 
-    def extract_bank_accounts(self, text: str) -> List[str]:
-        """Extract Indian bank account numbers (9-18 digits)."""
+        Values come from the UPI, www and shortener patterns, which start
+        with an alphanumeric and never contain whitespace, so only the
+        tail needs trimming.
+        """
+        return value.rstrip('.,;:!?)"\'>')
+
+    def _account_value(self, match: re.Match) -> Optional[str]:
+        """9-18 digit account number, unless it is really a phone number."""
+        num = match.group(1)
+        # Filter out phone numbers (10-digit starting with 6-9)
+        if len(num) == 10 and num[0] in self._MOBILE_FIRST_DIGITS:
+            return None
+        # Filter out 91XXXXXXXXXX (phone with country code)
+        if len(num) == 12 and num.startswith('91') and num[2] in self._MOBILE_FIRST_DIGITS:
+            return None
+        return num
+
+    def _card_value(self, match: re.Match) -> Optional[str]:
+        """Card format XXXX-XXXX-XXXX-XXXX or XXXX XXXX XXXX XXXX."""
+        return ''.join(match.groups())
+
+    def _upi_value(self, match: re.Match) -> Optional[str]:
+        """word@word match, unless the handle looks like an email domain."""
+        upi = self._clean_extracted_value(match.group(1).lower())
+        if not upi or '@' not in upi:
+            return None
+        suffix = upi.split('@')[-1]
+        # Skip if has email TLD or matches email provider
+        if self._RE_EMAIL_SUFFIX.search(suffix):
+            return None
+        return upi
+
+    def _split_phone_value(self, match: re.Match) -> Optional[str]:
+        """+91 number from its two five-digit groups (separated or not)."""
+        return '+91' + match.group(1) + match.group(2)
+
+    def _phone_value(self, match: re.Match) -> Optional[str]:
+        """+91 number from a pattern whose first group is the 10 digits."""
+        return '+91' + match.group(1)
+
+    def _url_value(self, match: re.Match) -> Optional[str]:
+        """http(s) URL; the pattern already leaves out trailing punctuation."""
+        return match.group(0)
+
+    def _www_value(self, match: re.Match) -> Optional[str]:
+        """www. URL without protocol, returned as https."""
+        url = self._clean_extracted_value(match.group(1))
+        return 'https://' + url if url else None
+
+    def _shortener_value(self, match: re.Match) -> Optional[str]:
+        """Link on a known URL shortener, returned as https."""
+        url = self._clean_extracted_value(match.group(1))
+        if not url:
+            return None
+        return 'https://' + url if not url.startswith('http') else url
+
+    # (field, pattern, value builder, required literal) for every extraction
+    # pattern; a pattern is skipped outright when its literal is absent.
+    # Patterns without a literal are purely numeric and only run on text
+    # that is long enough and contains a digit.
+    _PATTERNS = (
+        ('bankAccounts', _RE_ACCOUNT, _account_value, None),
+        ('bankAccounts', _RE_CARD, _card_value, None),
+        ('upiIds', _RE_UPI, _upi_value, '@'),
+        ('phoneNumbers', _RE_PHONE_PLUS91, _split_phone_value, '+91'),
+        ('phoneNumbers', _RE_PHONE_91, _phone_value, None),
+        ('phoneNumbers', _RE_PHONE_0, _phone_value, None),
+        ('phoneNumbers', _RE_PHONE_BARE, _phone_value, None),
+        ('phishingLinks', _RE_URL, _url_value, '://'),
+        ('phishingLinks', _RE_WWW, _www_value, '.'),
+        ('phishingLinks', _RE_SHORTENER, _shortener_value, '/'),
+    )
+    # Same table compiled with re.ASCII for pure-ASCII text, where it gives
+    # identical matches but skips Unicode \d/\w/case-folding lookups
+    _ASCII_PATTERNS = tuple(
+        (field, re.compile(pattern.pattern, pattern.flags & ~re.UNICODE | re.ASCII),
+         build_value, literal)
+        for field, pattern, build_value, literal in _PATTERNS
+    )
+
+    def _extract(self, text: str, fields: Tuple[str, ...]) -> Dict[str, Set[str]]:
+        """Run the patterns for ``fields`` over one normalized copy of ``text``."""
+        found = {field: set() for field in fields}
+        self._extract_into(text, found)
+        return found
+
+    def _extract_into(self, text: str, found: Dict[str, Set[str]]):
+        """Add values matched in ``text`` to the sets in ``found``, keyed by field."""
         text = self._normalize_text(text)
-        accounts = set()
-        
-        # Pattern: 9-18 digit sequences (account numbers)
-        for match in re.finditer(r'\b(\d{9,18})\b', text):
-            num = match.group(1)
-            # Filter out phone numbers (10-digit starting with 6-9)
-            if len(num) == 10 and num[0] in '6789':
+        patterns = self._ASCII_PATTERNS if text.isascii() else self._PATTERNS
+        has_digits = (len(text) >= self._MIN_NUMERIC_LEN
+                      and self._RE_DIGIT.search(text) is not None)
+        for field, pattern, build_value, literal in patterns:
+            if field not in found:
                 continue
-            # Filter out 91XXXXXXXXXX (phone with country code)
-            if len(num) == 12 and num.startswith('91') and num[2] in '6789':
+            if literal is None:
+                if not has_digits:
+                    continue
+            elif literal not in text:
                 continue
-            accounts.add(num)
-        
-        # Pattern: Card format XXXX-XXXX-XXXX-XXXX or XXXX XXXX XXXX XXXX
-        for match in re.finditer(r'\b(\d{4})[-\s]?(\d{4})[-\s]?(\d{4})[-\s]?(\d{4})\b', text):
-            accounts.add(''.join(match.groups()))
-        
-        return list(accounts)
+            values = found[field]
+            for match in pattern.finditer(text):
+                value = build_value(self, match)
+                if value:
+                    values.add(value)
+
+    def extract_bank_accounts(self, text: str) -> List[str]:
+        """Extract Indian bank account numbers (9-18 digits)."""
+        return list(self._extract(text, ('bankAccounts',))['bankAccounts'])
 
     def extract_upi_ids(self, text: str) -> List[str]:
         """Extract UPI IDs (format: something@bankhandle)."""
-        text = self._normalize_text(text.lower())
-        upi_ids = set()
-        
-        # Email TLDs to filter out
-        email_tlds = {'.com', '.org', '.net', '.in', '.co', '.io', '.edu', 
-                      '.gov', '.info', '.biz', '.me', '.us', '.uk', '.au'}
-        
-        # Common email providers to filter out  
-        email_providers = {'gmail', 'yahoo', 'hotmail', 'outlook', 'email', 
-                          'mail', 'protonmail', 'icloud', 'live', 'msn', 
-                          'aol', 'rediffmail', 'zoho', 'yandex'}
-        
-        # Match word@word patterns
-        for match in re.finditer(r'([a-zA-Z0-9][a-zA-Z0-9._-]*@[a-zA-Z0-9][a-zA-Z0-9._-]*)', text):
-            upi = self._clean_extracted_value(match.group(1))
-            
-            if not upi or '@' not in upi:
-                continue
-                
-            suffix = upi.split('@')[-1]
-            
-            # Skip if has email TLD
-            if any(suffix.endswith(tld) for tld in email_tlds):
-                continue
-            
-            # Skip if matches email provider
-            if any(provider in suffix for provider in email_providers):
-                continue
-            
-            upi_ids.add(upi)
-        
-        return list(upi_ids)
+        return list(self._extract(text, ('upiIds',))['upiIds'])
 
     def extract_phone_numbers(self, text: str) -> List[str]:
         """Extract Indian phone numbers in various formats."""
-        text = self._normalize_text(text)
-        phones = set()
-        
-        # Pattern 1: +91 with 10 digits (various formats)
-        for match in re.finditer(r'\+91[-\s.]?(\d{5})[-\s.]?(\d{5})', text):
-            phones.add('+91' + match.group(1) + match.group(2))
-        
-        for match in re.finditer(r'\+91[-\s.]?(\d{10})\b', text):
-            phones.add('+91' + match.group(1))
-        
-        # Pattern 2: 91 prefix (without +)
-        for match in re.finditer(r'\b91[-\s.]?(\d{10})\b', text):
-            phones.add('+91' + match.group(1))
-        
-        # Pattern 3: 0 prefix (landline format)
-        for match in re.finditer(r'\b0(\d{10})\b', text):
-            phones.add('+91' + match.group(1))
-        
-        # Pattern 4: Standalone 10-digit Indian mobile (starts with 6-9)
-        for match in re.finditer(r'(?<!\d)([6-9]\d{9})(?!\d)', text):
-            phones.add('+91' + match.group(1))
-        
-        return list(phones)
+        return list(self._extract(text, ('phoneNumbers',))['phoneNumbers'])
 
     def extract_phishing_links(self, text: str) -> List[str]:
         """Extract URLs and phishing links."""
-        text = self._normalize_text(text)
-        urls = set()
-        
-        # Pattern 1: Simple, aggressive regex for URLs
-        # Matches http/https followed by non-whitespace characters
-        print(f"DEBUG: Extracting URLs from text: {text[:50]}...")
-        url_pattern = r'https?://[^\s<>"]+'
-        for match in re.finditer(url_pattern, text, re.IGNORECASE):
-            url = match.group(0)
-            print(f"DEBUG: Regex matched: {url}")
-            # Clean trailing punctuation
-            url = url.rstrip('.,;:!?)">]')
-            if url:
-                urls.add(url)
-                print(f"DEBUG: Added URL: {url}")
-        
-        # Pattern 2: www. URLs without protocol
-        for match in re.finditer(r'\b(www\.[^\s<>"\'`\[\]{}|\\^]+)', text, re.IGNORECASE):
-            url = self._clean_extracted_value(match.group(1))
-            if url:
-                urls.add('https://' + url)
-        
-        # Pattern 3: Common URL shorteners
-        shorteners = ['bit.ly', 'tinyurl.com', 'goo.gl', 't.co', 'cutt.ly', 
-                      'shorturl.at', 'rb.gy', 'ow.ly', 'is.gd', 'v.gd']
-        for shortener in shorteners:
-            pattern = rf'({re.escape(shortener)}/[^\s<>"\']+)'
-            for match in re.finditer(pattern, text, re.IGNORECASE):
-                url = self._clean_extracted_value(match.group(1))
-                if url:
-                    urls.add('https://' + url if not url.startswith('http') else url)
-        
-        return list(urls)
+        return list(self._extract(text, ('phishingLinks',))['phishingLinks'])
 
     def extract_suspicious_keywords(self, text: str) -> List[str]:
         """Extract suspicious/scam-related keywords."""
-        keywords = [
-            # Urgency
-            "urgent", "immediately", "right now", "within minutes", "hurry",
-            # Threats
-            "blocked", "suspended", "freeze", "locked", "terminated", "deactivated",
-            # Verification
-            "verify", "confirm", "validate", "authenticate",
-            # Credentials
-            "otp", "pin", "password", "cvv", "mpin", "atm pin",
-            # Identity
-            "kyc", "pan", "aadhar", "identity", "pan card",
-            # Money
-            "refund", "cashback", "prize", "lottery", "winner", "reward", "bonus",
-            # Actions
-            "claim", "redeem", "collect", "receive",
-            # Alerts
-            "warning", "alert", "security", "unauthorized", "suspicious activity",
-            # State
-            "compromised", "hacked", "expired", "expiring"
-        ]
-        
-        text_lower = text.lower()
-        found = []
-        
-        for keyword in keywords:
-            if keyword in text_lower:
-                found.append(keyword)
-        
-        return list(set(found))
+        # Single pass over the text; the automaton reports every keyword
+        # occurrence, overlapping ones included
+        return list({keyword for _, keyword in _KEYWORD_AUTOMATON.iter(text.lower())})
 
     def extract_all(self, messages: List[Dict]) -> ExtractedIntelligence:
         """Extract all intelligence from a list of messages."""
-        # Combine all message text
-        all_text = " ".join([str(msg.get("text", "")) for msg in messages])
+        found = {field: set() for field in self._FIELDS}
+        keywords = set()
+        
+        # Scan each message on its own instead of joining the conversation:
+        # no intermediate copy, and the literal/digit gates in
+        # _extract_into can skip patterns per message
+        for msg in messages:
+            text = str(msg.get("text", ""))
+            # Nothing to scan in blank messages
+            if not text or text.isspace():
+                continue
+            self._extract_into(text, found)
+            keywords.update(keyword for _, keyword in _KEYWORD_AUTOMATON.iter(text.lower()))
         
         return ExtractedIntelligence(
-            bankAccounts=self.extract_bank_accounts(all_text),
-            upiIds=self.extract_upi_ids(all_text),
-            phoneNumbers=self.extract_phone_numbers(all_text),
-            phishingLinks=self.extract_phishing_links(all_text),
-            suspiciousKeywords=self.extract_suspicious_keywords(all_text)
+            bankAccounts=list(found['bankAccounts']),
+            upiIds=list(found['upiIds']),
+            phoneNumbers=list(found['phoneNumbers']),
+            phishingLinks=list(found['phishingLinks']),
+            suspiciousKeywords=list(keywords)
         )
 
-    async def generate_agent_notes(self, messages: List[Dict], intelligence: ExtractedIntelligence = None) -> str:
+    def generate_agent_notes(self, messages: List[Dict], intelligence: ExtractedIntelligence = None) -> str:
         """Generate factual summary notes about the scam conversation."""
         # Extract intelligence if not provided
         if intelligence is None:
@@ -8,8 +8,12 @@ This FastAPI application provides an endpoint to:
 4. Send final results to GUVI evaluation endpoint
 """
 
+import asyncio
+import logging
 import os
+import queue
 from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional
 
 from fastapi import FastAPI, HTTPException, Header, Depends
@@ -19,13 +23,40 @@ from dotenv import load_dotenv
 from models import AnalyzeRequest, AnalyzeResponse, ExtractedIntelligence
 from session_manager import session_manager
 from scam_detector import ScamDetector
-from agent import HoneypotAgent
+from agent import HoneypotAgent, conversation_stage
 from intelligence_extractor import IntelligenceExtractor
-from guvi_callback import send_final_result
+from guvi_callback import send_final_result, close_client
+from groq_client import close_clients
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# While the app runs, records are formatted on the event loop and queued;
+# a listener thread does the blocking write to stderr. The queue handler is
+# only attached while the listener is running, so nothing piles up undrained
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_log_queue_handler = QueueHandler(_log_queue)
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(
+    logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+)
+_log_listener = QueueListener(_log_queue, _log_handler)
+
+
+def _configure_logging():
+    """Attach the queue handler and apply LOG_LEVEL (INFO if unset or unknown)."""
+    level_name = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+    level = logging.getLevelNamesMapping().get(level_name)
+    root = logging.getLogger()
+    root.setLevel(logging.INFO if level is None else level)
+    root.addHandler(_log_queue_handler)
+    # httpx logs every request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if level is None:
+        logger.warning("Unknown LOG_LEVEL %r, using INFO", level_name)
+
 # Global instances
 scam_detector: Optional[ScamDetector] = None
 honeypot_agent: Optional[HoneypotAgent] = None
@@ -36,6 +67,8 @@ intel_extractor: Optional[IntelligenceExtractor] = None
 async def lifespan(app: FastAPI):
     """Initialize components on startup."""
     global scam_detector, honeypot_agent, intel_extractor
+    _log_listener.start()
+    _configure_logging()
     
     # Use GROQ_API_KEY
     api_key = os.getenv("GROQ_API_KEY")
@@ -43,12 +76,23 @@ async def lifespan(app: FastAPI):
         raise RuntimeError("GROQ_API_KEY environment variable not set")
     
     scam_detector = ScamDetector(api_key)
-    honeypot_agent = HoneypotAgent(api_key)
+    honeypot_agent = HoneypotAgent(
+        api_key,
+        cache_threshold=float(os.getenv("REPLY_CACHE_THRESHOLD", "0.93")),
+        cache_size=int(os.getenv("REPLY_CACHE_SIZE", "512"))
+    )
     intel_extractor = IntelligenceExtractor(api_key)
+
+    # Pay the TLS handshake to Groq now rather than on the first request
+    await honeypot_agent.warm_up()
     
-    print("🍯 Agentic Honey-Pot API initialized successfully (Groq LLM)")
+    logger.info("🍯 Agentic Honey-Pot API initialized successfully (Groq LLM)")
     yield
-    print("🍯 Agentic Honey-Pot API shutting down")
+    await close_client()
+    await close_clients()
+    logger.info("🍯 Agentic Honey-Pot API shutting down")
+    logging.getLogger().removeHandler(_log_queue_handler)
+    _log_listener.stop()
 
 
 # Initialize FastAPI app
@@ -158,11 +202,44 @@ async def analyze_message(
         "timestamp": message.timestamp
     })
 
-    # Detect scam intent (on first message or if not yet detected)
+    # Extracted intelligence only ever accumulates, so scan just the messages
+    # this session recorded since the last scan (the current message plus
+    # our previous reply), taken from the end of the history the client
+    # sent. That holds for growing, sliding-window and empty histories; a
+    # session's first scan covers everything
+    if session.extracted_upto:
+        new_messages = session.total_messages - session.extracted_upto
+        scan_from = max(0, len(full_history) - new_messages)
+    else:
+        scan_from = 0
+    intelligence = intel_extractor.extract_all(full_history[scan_from:])
+    session_manager.update_intelligence(
+        session_id, intelligence, extracted_upto=session.total_messages
+    )
+
+    # Reuse the session's rolling buffers unless this worker has not seen
+    # the whole conversation (e.g. after a restart)
+    session_is_complete = session.total_messages >= len(full_history)
+
+    # Generate agent response
+    reply_coro = honeypot_agent.generate_response(
+        current_message=message.text,
+        conversation_history=full_history,
+        metadata=metadata.model_dump() if metadata else None,
+        chat_tail=session.chat_tail if session_is_complete else None,
+        recent_replies=session.recent_replies if session_is_complete else None
+    )
+
+    # Detect scam intent (on first message or if not yet detected). The
+    # reply does not depend on the verdict, so both LLM calls run concurrently
     if not session.scam_detected:
-        detection_result = await scam_detector.detect(
-            message.text,
-            full_history
+        detection_result, agent_reply = await asyncio.gather(
+            scam_detector.detect(
+                message.text,
+                full_history,
+                history_text=session.recent_history_text() if session_is_complete else None
+            ),
+            reply_coro
         )
         
         if detection_result["is_scam"]:
@@ -170,17 +247,8 @@ async def analyze_message(
                 session_id,
                 detection_result["confidence"]
             )
-
-    # Extract intelligence from all messages
-    intelligence = intel_extractor.extract_all(full_history)
-    session_manager.update_intelligence(session_id, intelligence)
-
-    # Generate agent response
-    agent_reply = await honeypot_agent.generate_response(
-        current_message=message.text,
-        conversation_history=full_history,
-        metadata=metadata.model_dump() if metadata else None
-    )
+    else:
+        agent_reply = await reply_coro
 
     # Add agent's response to session
     import time
@@ -193,15 +261,15 @@ async def analyze_message(
 
     # Check if conversation should end
     session = session_manager.get(session_id)
-    should_end, end_reason = await honeypot_agent.should_end_conversation(
-        session.messages,
-        session.extracted_intelligence.model_dump()
+    should_end, end_reason = honeypot_agent.should_end_conversation(
+        session.total_messages,
+        session.extracted_intelligence
     )
 
     # Send callback if conversation should end and we detected a scam
     if should_end and session.scam_detected and not session.callback_sent:
         # Generate agent notes with extracted intelligence
-        agent_notes = await intel_extractor.generate_agent_notes(
+        agent_notes = intel_extractor.generate_agent_notes(
             session.messages, 
             session.extracted_intelligence
         )
@@ -218,29 +286,21 @@ async def analyze_message(
         
         if callback_result["success"]:
             session_manager.mark_callback_sent(session_id)
-            print(f"✅ Callback sent for session {session_id}")
+            logger.info("✅ Callback sent for session %s", session_id)
         else:
-            print(f"❌ Callback failed for session {session_id}: {callback_result}")
+            logger.warning(
+                "❌ Callback failed for session %s: %r", session_id, callback_result
+            )
 
     # Calculate conversation stage for metrics
-    msg_count = session.total_messages
-    if msg_count == 0:
-        stage = 1
-    elif msg_count <= 2:
-        stage = 2
-    elif msg_count <= 5:
-        stage = 3
-    elif msg_count <= 8:
-        stage = 4
-    elif msg_count <= 12:
-        stage = 5
-    elif msg_count <= 16:
-        stage = 6
-    else:
-        stage = 7
+    stage = conversation_stage(session.total_messages)
 
     # Return complete response with all metrics for evaluation
-    print(f"DEBUG: Final Intelligence for session {session_id}: {session.extracted_intelligence.model_dump()}")
+    # Formatted only when debug logging is enabled
+    logger.debug(
+        "Final intelligence for session %s: %r",
+        session_id, session.extracted_intelligence
+    )
     return AnalyzeResponse(
         status="success",
         reply=agent_reply,
@@ -0,0 +1,170 @@
+"""In-process caches for LLM responses."""
+
+import hashlib
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Collection, Dict, Hashable, NamedTuple, Optional, Tuple
+
+_DIGIT_RUN = re.compile(r"\d+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class Embedding(NamedTuple):
+    """Sparse trigram vector kept as raw integer counts plus its L2 norm."""
+    counts: Dict[str, int]
+    norm: float
+
+
+def embed(text: str) -> Embedding:
+    """Embed text as a bag of character trigrams.
+
+    Digit runs are collapsed so templated messages that only differ in
+    phone numbers, amounts or account numbers land on the same vector.
+    Counts stay as small ints (shared objects in CPython) rather than
+    normalized floats; the norm is applied once per comparison.
+    """
+    text = _DIGIT_RUN.sub("#", text.lower())
+    text = " " + _WHITESPACE.sub(" ", text).strip() + " "
+    counts = Counter(text[i:i + 3] for i in range(len(text) - 2))
+    norm = math.sqrt(sum(c * c for c in counts.values())) or 1.0
+    return Embedding(dict(counts), norm)
+
+
+class _Bucket:
+    """Entries of one cache bucket, stored column-wise by entry id.
+
+    Alongside the vector, reply and last-use columns it keeps an inverted
+    index from trigram to the entries containing it, so dot products are
+    accumulated only for entries that share a trigram with the query.
+    """
+
+    def __init__(self):
+        self.vectors: Dict[int, Embedding] = {}
+        self.replies: Dict[int, str] = {}
+        self.last_used: Dict[int, int] = {}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self.replies)
+
+    def add(self, vector: Embedding, reply: str, tick: int):
+        entry_id = self._next_id
+        self._next_id += 1
+        self.vectors[entry_id] = vector
+        self.replies[entry_id] = reply
+        self.last_used[entry_id] = tick
+        for gram, count in vector.counts.items():
+            self.postings.setdefault(gram, {})[entry_id] = count
+
+    def evict_least_recent(self):
+        entry_id = min(self.last_used, key=self.last_used.__getitem__)
+        del self.replies[entry_id], self.last_used[entry_id]
+        for gram in self.vectors.pop(entry_id).counts:
+            posting = self.postings[gram]
+            del posting[entry_id]
+            if not posting:
+                del self.postings[gram]
+
+    def nearest(
+        self,
+        vector: Embedding,
+        threshold: float,
+        exclude: Collection[str]
+    ) -> Optional[int]:
+        """Id of the most similar entry scoring at least ``threshold``.
+
+        Ties go to the most recently used entry.
+        """
+        dots: Dict[int, int] = {}
+        for gram, count in vector.counts.items():
+            posting = self.postings.get(gram)
+            if posting:
+                for entry_id, entry_count in posting.items():
+                    dots[entry_id] = dots.get(entry_id, 0) + count * entry_count
+
+        best_id, best_key = None, (threshold, -1)
+        for entry_id, dot in dots.items():
+            if self.replies[entry_id] in exclude:
+                continue
+            score = dot / (vector.norm * self.vectors[entry_id].norm)
+            key = (score, self.last_used[entry_id])
+            if key >= best_key:
+                best_id, best_key = entry_id, key
+        return best_id
+
+
+class SemanticCache:
+    """Nearest-neighbour reply cache, bucketed by conversation stage."""
+
+    def __init__(self, threshold: float = 0.93, max_entries: int = 512):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._buckets: Dict[Hashable, _Bucket] = {}
+        self._tick = 0
+
+    def get(
+        self,
+        bucket: Hashable,
+        vector: Embedding,
+        exclude: Collection[str] = ()
+    ) -> Optional[str]:
+        """Return the closest cached reply above the threshold, if any."""
+        entries = self._buckets.get(bucket)
+        if not entries:
+            return None
+
+        entry_id = entries.nearest(vector, self.threshold, exclude)
+        if entry_id is None:
+            return None
+
+        # Refresh the hit so eviction drops least recently used
+        self._tick += 1
+        entries.last_used[entry_id] = self._tick
+        return entries.replies[entry_id]
+
+    def put(self, bucket: Hashable, vector: Embedding, reply: str):
+        """Store a reply for the given message vector."""
+        entries = self._buckets.get(bucket)
+        if entries is None:
+            entries = self._buckets[bucket] = _Bucket()
+        self._tick += 1
+        entries.add(vector, reply, self._tick)
+        if len(entries) > self.max_entries:
+            entries.evict_least_recent()
+
+
+class ExactCache:
+    """LRU reply cache for byte-identical messages, checked before the semantic one."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Hashable, bytes], str]" = OrderedDict()
+
+    @staticmethod
+    def _key(bucket: Hashable, text: str) -> Tuple[Hashable, bytes]:
+        digest = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        return bucket, digest
+
+    def get(
+        self,
+        bucket: Hashable,
+        text: str,
+        exclude: Collection[str] = ()
+    ) -> Optional[str]:
+        """Return the reply cached for exactly this message, if any."""
+        key = self._key(bucket, text)
+        reply = self._entries.get(key)
+        if reply is None or reply in exclude:
+            return None
+        self._entries.move_to_end(key)
+        return reply
+
+    def put(self, bucket: Hashable, text: str, reply: str):
+        """Store a reply for the given message text."""
+        key = self._key(bucket, text)
+        self._entries[key] = reply
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
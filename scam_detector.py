@@ -1,8 +1,17 @@
 """Scam detection engine using LLM and keyword patterns."""
 
+import asyncio
+import logging
 import re
-from typing import List, Dict, Tuple
-from groq import Groq
+from typing import List, Dict, Optional, Tuple
+import ahocorasick
+import orjson
+from groq import AsyncGroq
+
+from groq_client import LLM_SEMAPHORE, get_client
+from response_cache import ExactCache, SemanticCache, embed
+
+logger = logging.getLogger(__name__)
 
 # Suspicious keywords and phrases commonly used in scams
 SCAM_KEYWORDS = [
@@ -17,6 +26,13 @@ SCAM_KEYWORDS = [
     "arrest warrant", "legal action", "case filed", "money laundering"
 ]
 
+# Aho-Corasick automaton over all keywords, built once at import; each
+# keyword maps to its index so results keep SCAM_KEYWORDS order
+_KEYWORD_AUTOMATON = ahocorasick.Automaton()
+for _index, _keyword in enumerate(SCAM_KEYWORDS):
+    _KEYWORD_AUTOMATON.add_word(_keyword, _index)
+_KEYWORD_AUTOMATON.make_automaton()
+
 # Patterns that indicate scam intent
 SCAM_PATTERNS = [
     r"your\s+(bank\s+)?account\s+(will\s+be\s+|is\s+|has\s+been\s+)(blocked|suspended|frozen)",
@@ -31,47 +47,28 @@ SCAM_PATTERNS = [
     r"(rbi|reserve\s+bank|income\s+tax|police|customs)\s+(notice|warning|action)",
 ]
 
+# Compiled once at import; IGNORECASE replaces lowercasing every message
+_COMPILED_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in SCAM_PATTERNS]
 
-class ScamDetector:
-    """Detects scam intent in messages using LLM and patterns."""
+# Both fields the verdict needs have arrived once a CONFIDENCE value is
+# followed by something that cannot extend the number
+_VERDICT_DONE_RE = re.compile(r"IS_SCAM:.*?CONFIDENCE:\s*[\d.]+[^\d.]", re.IGNORECASE | re.DOTALL)
 
-    def __init__(self, api_key: str):
-        """Initialize with Groq API key."""
-        self.client = Groq(api_key=api_key)
-        self.model = "llama-3.3-70b-versatile"
+# Verdict fields in the LLM response, all optional and in any order
+_RESPONSE_RE = re.compile(
+    r"(?=(?:.*?(?P<scam>IS_SCAM: YES))?)"
+    r"(?=(?:.*?CONFIDENCE:\s*(?P<confidence>[\d.]+))?)"
+    r"(?=(?:.*?REASON:\s*(?P<reason>[^\n]+))?)",
+    re.IGNORECASE | re.DOTALL
+)
 
-    def detect_keywords(self, text: str) -> List[str]:
-        """Find scam-related keywords in text."""
-        text_lower = text.lower()
-        found = []
-        for keyword in SCAM_KEYWORDS:
-            if keyword in text_lower:
-                found.append(keyword)
-        return found
 
-    def detect_patterns(self, text: str) -> List[str]:
-        """Find scam patterns in text using regex."""
-        text_lower = text.lower()
-        found = []
-        for pattern in SCAM_PATTERNS:
-            if re.search(pattern, text_lower):
-                found.append(pattern)
-        return found
-
-    async def analyze_with_llm(self, text: str, history: List[Dict] = None) -> Tuple[bool, float, str]:
-        """Use LLM to analyze if the message is a scam."""
-        history_text = ""
-        if history:
-            history_text = "\n".join([
-                f"{msg['sender']}: {msg['text']}" for msg in history[-5:]
-            ])
-
-        prompt = f"""Analyze this message for scam/fraud indicators.
-
-Conversation:
-{history_text if history_text else "No history"}
+class ScamDetector:
+    """Detects scam intent in messages using LLM and patterns."""
 
-Latest message: "{text}"
+    # Static instructions go first as the system message so the provider
+    # can reuse the cached prefix; only the conversation varies per call
+    SYSTEM_PROMPT = """Analyze the message you are given for scam/fraud indicators.
 
 SCAM TYPES TO DETECT:
 1. Bank fraud - fake account blocking, OTP theft
@@ -86,45 +83,185 @@ IS_SCAM: YES or NO
 CONFIDENCE: 0.0 to 1.0
 REASON: One sentence explanation"""
 
-        try:
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-                max_tokens=100
-            )
-            response_text = completion.choices[0].message.content
-
-            is_scam = "IS_SCAM: YES" in response_text.upper()
-            
-            confidence = 0.5
-            conf_match = re.search(r"CONFIDENCE:\s*([\d.]+)", response_text, re.IGNORECASE)
-            if conf_match:
-                try:
-                    confidence = float(conf_match.group(1))
-                except ValueError:
-                    pass
+    SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
 
-            reasoning = "Analysis complete"
-            reason_match = re.search(r"REASON:\s*(.+)", response_text, re.IGNORECASE)
-            if reason_match:
-                reasoning = reason_match.group(1).strip()
+    # Messages shorter than this with no keyword or pattern hit are treated
+    # as benign without asking the LLM
+    PREFILTER_MAX_LENGTH = 20
 
-            return is_scam, confidence, reasoning
+    # Fast-model confidences strictly inside this range are re-asked of the
+    # large model, whose verdict then replaces the fast one
+    ESCALATION_BAND = (0.3, 0.7)
+
+    def __init__(
+        self,
+        api_key: str,
+        client: Optional[AsyncGroq] = None,
+        cache_threshold: float = 0.93,
+        cache_size: int = 512
+    ):
+        """Initialize with Groq API key (or an existing async client) and verdict cache settings."""
+        self.client = client or get_client(api_key)
+        # The small model answers first; the large one only re-checks
+        # verdicts whose confidence falls inside ESCALATION_BAND
+        self.fast_model = "llama-3.1-8b-instant"
+        self.model = "llama-3.3-70b-versatile"
+        # Scam openers are templated, so the LLM verdict for a conversation
+        # is cached by its exact text and by near-duplicate similarity
+        self.exact_cache = ExactCache(max_entries=4096)
+        self.verdict_cache = SemanticCache(
+            threshold=cache_threshold, max_entries=cache_size
+        )
+
+    def detect_keywords(self, text: str) -> List[str]:
+        """Find scam-related keywords in text."""
+        hits = {index for _, index in _KEYWORD_AUTOMATON.iter(text.lower())}
+        return [SCAM_KEYWORDS[index] for index in sorted(hits)]
+
+    def detect_patterns(self, text: str) -> List[str]:
+        """Find scam patterns in text using regex."""
+        return [
+            pattern.pattern for pattern in _COMPILED_PATTERNS
+            if pattern.search(text)
+        ]
+
+    async def _stream_verdict(self, model: str, prompt: str) -> str:
+        """Stream the LLM verdict, hanging up once IS_SCAM and CONFIDENCE are in.
+
+        The REASON sentence is most of the output and nothing downstream
+        needs it, so it is only kept if the model emits it early.
+        """
+        response_text = ""
+        async with LLM_SEMAPHORE, self.client.chat.completions.with_streaming_response.create(
+            model=model,
+            messages=[
+                self.SYSTEM_MESSAGE,
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.2,
+            max_tokens=100,
+            stream=True,
+        ) as response:
+            async for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = orjson.loads(data).get("choices")
+                if not choices:
+                    continue
+                content = choices[0]["delta"].get("content")
+                if content:
+                    response_text += content
+                    if _VERDICT_DONE_RE.search(response_text):
+                        break
+        return response_text
+
+    async def _verdict(self, model: str, prompt: str) -> Tuple[bool, float, str]:
+        """Get one model's verdict for a prompt, from cache or the LLM."""
+        response_text = self.exact_cache.get(model, prompt)
+        if response_text is None:
+            cache_vector = embed(prompt)
+            response_text = self.verdict_cache.get(model, cache_vector)
+            if response_text is None:
+                response_text = await self._stream_verdict(model, prompt)
+                if response_text:
+                    self.verdict_cache.put(model, cache_vector, response_text)
+            if response_text:
+                self.exact_cache.put(model, prompt, response_text)
+
+        # One match call reads all three fields; each lookahead finds its
+        # field's first occurrence anywhere and is skipped if absent
+        fields = _RESPONSE_RE.match(response_text)
+        is_scam = fields["scam"] is not None
+
+        confidence = 0.5
+        if fields["confidence"]:
+            try:
+                confidence = float(fields["confidence"])
+            except ValueError:
+                pass
+
+        reasoning = "Analysis complete"
+        if fields["reason"]:
+            reasoning = fields["reason"].strip()
+
+        return is_scam, confidence, reasoning
+
+    async def analyze_with_llm(
+        self,
+        text: str,
+        history: List[Dict] = None,
+        history_text: Optional[str] = None
+    ) -> Tuple[bool, float, str]:
+        """Use LLM to analyze if the message is a scam.
+
+        ``history_text`` is the already formatted last five messages (see
+        SessionState.recent_history_text); otherwise it is built from ``history``.
+        """
+        if history_text is None:
+            history_text = ""
+            if history:
+                history_text = "\n".join([
+                    f"{msg['sender']}: {msg['text']}" for msg in history[-5:]
+                ])
+
+        # Only the conversation goes in the user message (and the cache key);
+        # the instructions live in SYSTEM_PROMPT
+        prompt = f"""Conversation:
+{history_text if history_text else "No history"}
+
+Latest message: "{text}\""""
+
+        try:
+            verdict = await self._verdict(self.fast_model, prompt)
+            # Only a borderline verdict is worth the larger model's latency
+            _, confidence, _ = verdict
+            low, high = self.ESCALATION_BAND
+            if low < confidence < high:
+                try:
+                    verdict = await self._verdict(self.model, prompt)
+                except Exception as e:
+                    logger.warning("LLM escalation failed, keeping fast verdict: %r", e)
+            return verdict
 
         except Exception as e:
-            print(f"LLM analysis failed: {e}")
+            logger.warning("LLM analysis failed: %r", e)
             keywords = self.detect_keywords(text)
             patterns = self.detect_patterns(text)
             is_scam = len(keywords) >= 2 or len(patterns) >= 1
             confidence = min(0.3 + (len(keywords) * 0.1) + (len(patterns) * 0.2), 1.0)
             return is_scam, confidence, "Pattern-based detection (LLM unavailable)"
 
-    async def detect(self, text: str, history: List[Dict] = None) -> Dict:
+    async def detect(
+        self,
+        text: str,
+        history: List[Dict] = None,
+        history_text: Optional[str] = None
+    ) -> Dict:
         """Main detection method combining all signals."""
+        # Short replies ("ok", "who is this?") are scanned first and skip the
+        # LLM when nothing scam-like shows up. Otherwise start the LLM call and
+        # let it run up to its first network wait, so the local scans below
+        # overlap the round-trip instead of preceding it
+        llm_task = None
+        if len(text) >= self.PREFILTER_MAX_LENGTH:
+            llm_task = asyncio.create_task(self.analyze_with_llm(text, history, history_text))
+            await asyncio.sleep(0)
         keywords = self.detect_keywords(text)
         patterns = self.detect_patterns(text)
-        llm_is_scam, llm_confidence, llm_reasoning = await self.analyze_with_llm(text, history)
+        if llm_task is None:
+            if not keywords and not patterns:
+                return {
+                    "is_scam": False,
+                    "confidence": 0.0,
+                    "detected_keywords": [],
+                    "detected_patterns": 0,
+                    "llm_reasoning": "Prefiltered: no indicators"
+                }
+            llm_task = self.analyze_with_llm(text, history, history_text)
+        llm_is_scam, llm_confidence, llm_reasoning = await llm_task
 
         keyword_score = min(len(keywords) * 0.15, 0.5)
         pattern_score = min(len(patterns) * 0.25, 0.5)
@@ -1,43 +1,98 @@
 """Session management for tracking conversations."""
 
-from typing import Dict, List, Optional
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Deque, Dict, Optional
 from dataclasses import dataclass, field
 from models import MessageInput, ExtractedIntelligence
 
 
-@dataclass
+@dataclass(slots=True)
 class SessionState:
     """State for a single conversation session."""
     session_id: str
     scam_detected: bool = False
     scam_confidence: float = 0.0
-    messages: List[Dict] = field(default_factory=list)
+    # Only the most recent messages are kept; message_count has the total
+    messages: Deque[Dict] = field(default_factory=lambda: deque(maxlen=200))
+    message_count: int = 0
+    # Last few messages pre-formatted as LLM chat turns for the agent
+    chat_tail: Deque[Dict] = field(default_factory=lambda: deque(maxlen=8))
+    # Last few agent replies, checked to avoid repeating ourselves
+    recent_replies: Deque[str] = field(default_factory=lambda: deque(maxlen=5))
     extracted_intelligence: ExtractedIntelligence = field(
         default_factory=ExtractedIntelligence
     )
+    # message_count as of the last merge into extracted_intelligence
+    extracted_upto: int = 0
     agent_notes: str = ""
     callback_sent: bool = False
+    # time.monotonic() of the last lookup, used for idle expiry
+    last_active: float = 0.0
+    # Formatted last five messages for the scam detector, reset on each append
+    history_text: Optional[str] = None
 
     @property
     def total_messages(self) -> int:
-        return len(self.messages)
+        return self.message_count
 
+    def recent_history_text(self) -> str:
+        """Last five messages as "sender: text" lines, formatted once per append."""
+        if self.history_text is None:
+            tail = islice(self.messages, max(0, len(self.messages) - 5), None)
+            self.history_text = "\n".join(
+                f"{msg['sender']}: {msg['text']}" for msg in tail
+            )
+        return self.history_text
 
-class SessionManager:
-    """In-memory session store for conversation tracking."""
 
-    def __init__(self):
-        self._sessions: Dict[str, SessionState] = {}
+class SessionManager:
+    """In-memory session store for conversation tracking.
+
+    Sessions are kept in least-recently-used order. Ones idle for longer
+    than ``ttl_seconds`` are dropped, and the least recently used one is
+    evicted once more than ``max_sessions`` are held, so memory stays
+    bounded however many session ids callers invent.
+    """
+
+    def __init__(self, max_sessions: int = 10_000, ttl_seconds: float = 3600.0):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+
+    def _expire(self, now: float):
+        """Drop sessions idle past the TTL; the oldest sit at the front."""
+        sessions = self._sessions
+        while sessions:
+            oldest = next(iter(sessions.values()))
+            if now - oldest.last_active < self.ttl_seconds:
+                break
+            sessions.popitem(last=False)
 
     def get_or_create(self, session_id: str) -> SessionState:
         """Get existing session or create a new one."""
-        if session_id not in self._sessions:
-            self._sessions[session_id] = SessionState(session_id=session_id)
-        return self._sessions[session_id]
+        now = time.monotonic()
+        self._expire(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = SessionState(session_id=session_id)
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_active = now
+        return session
 
     def get(self, session_id: str) -> Optional[SessionState]:
         """Get session by ID, returns None if not found."""
-        return self._sessions.get(session_id)
+        now = time.monotonic()
+        self._expire(now)
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            session.last_active = now
+        return session
 
     def add_message(self, session_id: str, sender: str, text: str, timestamp: int):
         """Add a message to the session history."""
@@ -47,6 +102,14 @@ class SessionManager:
             "text": text,
             "timestamp": timestamp
         })
+        session.message_count += 1
+        session.history_text = None
+        session.chat_tail.append({
+            "role": "user" if sender == "scammer" else "assistant",
+            "content": text
+        })
+        if sender != "scammer":
+            session.recent_replies.append(text)
 
     def mark_scam_detected(self, session_id: str, confidence: float):
         """Mark session as having detected scam intent."""
@@ -57,26 +120,28 @@ class SessionManager:
     def update_intelligence(
         self,
         session_id: str,
-        intelligence: ExtractedIntelligence
+        intelligence: ExtractedIntelligence,
+        extracted_upto: Optional[int] = None
     ):
-        """Update extracted intelligence for a session."""
+        """Update extracted intelligence for a session.
+
+        ``extracted_upto`` records the session's message_count at this scan,
+        so the next turn only needs to extract from messages added since.
+        """
         session = self.get_or_create(session_id)
-        # Merge new intelligence with existing
-        session.extracted_intelligence.bankAccounts = list(set(
-            session.extracted_intelligence.bankAccounts + intelligence.bankAccounts
-        ))
-        session.extracted_intelligence.upiIds = list(set(
-            session.extracted_intelligence.upiIds + intelligence.upiIds
-        ))
-        session.extracted_intelligence.phishingLinks = list(set(
-            session.extracted_intelligence.phishingLinks + intelligence.phishingLinks
-        ))
-        session.extracted_intelligence.phoneNumbers = list(set(
-            session.extracted_intelligence.phoneNumbers + intelligence.phoneNumbers
-        ))
-        session.extracted_intelligence.suspiciousKeywords = list(set(
-            session.extracted_intelligence.suspiciousKeywords + intelligence.suspiciousKeywords
-        ))
+        if extracted_upto is not None:
+            session.extracted_upto = extracted_upto
+        # Merge new intelligence with existing, appending only unseen values
+        current = session.extracted_intelligence
+        for name, new_values in intelligence:
+            if not new_values:
+                continue
+            values = getattr(current, name)
+            seen = set(values)
+            for value in new_values:
+                if value not in seen:
+                    seen.add(value)
+                    values.append(value)
 
     def set_agent_notes(self, session_id: str, notes: str):
         """Set agent notes for a session."""
@@ -90,8 +155,7 @@ class SessionManager:
 
     def delete(self, session_id: str):
         """Delete a session."""
-        if session_id in self._sessions:
-            del self._sessions[session_id]
+        self._sessions.pop(session_id, None)
 
 
 # Global session manager instance
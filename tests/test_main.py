@@ -0,0 +1,97 @@
+"""API tests for the /analyze endpoint, with the LLM calls patched out."""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+os.environ.setdefault("API_SECRET_KEY", "test-secret")
+
+from fastapi.testclient import TestClient
+
+import main
+from agent import HoneypotAgent
+from scam_detector import ScamDetector
+from session_manager import session_manager
+
+
+async def _no_warm_up(self):
+    return None
+
+
+async def _llm_verdict(self, text, history=None, history_text=None):
+    return True, 0.9, "Test verdict"
+
+
+async def _agent_reply(self, current_message, *args, **kwargs):
+    return "Arre beta, which bank is this? Please explain slowly."
+
+
+class AnalyzeEndpointTest(unittest.TestCase):
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(HoneypotAgent, "warm_up", _no_warm_up),
+            mock.patch.object(HoneypotAgent, "generate_response", _agent_reply),
+            mock.patch.object(ScamDetector, "analyze_with_llm", _llm_verdict),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _post(self, client, session_id, text, history):
+        response = client.post(
+            "/analyze",
+            headers={"x-api-key": os.environ["API_SECRET_KEY"]},
+            json={
+                "sessionId": session_id,
+                "message": {"sender": "scammer", "text": text, "timestamp": 0},
+                "conversationHistory": history,
+            },
+        )
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json()
+
+    def test_empty_history_extracts_every_turn(self):
+        """Clients that never echo history still get each message scanned."""
+        session_id = "empty-history"
+        self.addCleanup(session_manager.delete, session_id)
+        turns = [
+            "Your SBI account is blocked, call 9876543210 urgently",
+            "Pay the fine to UPI fraud@ybl right now",
+            "Or complete KYC at http://sbi-kyc.fake.com today",
+        ]
+        with TestClient(main.app) as client:
+            for text in turns:
+                data = self._post(client, session_id, text, [])
+
+        intelligence = data["extractedIntelligence"]
+        self.assertIn("+919876543210", intelligence["phoneNumbers"])
+        self.assertIn("fraud@ybl", intelligence["upiIds"])
+        self.assertIn("http://sbi-kyc.fake.com", intelligence["phishingLinks"])
+
+    def test_growing_history_extracts_new_messages(self):
+        session_id = "growing-history"
+        self.addCleanup(session_manager.delete, session_id)
+        turns = [
+            "Your SBI account is blocked, call 9876543210 urgently",
+            "Pay the fine to UPI fraud@ybl right now",
+        ]
+        history = []
+        with TestClient(main.app) as client:
+            for text in turns:
+                data = self._post(client, session_id, text, history)
+                history += [
+                    {"sender": "scammer", "text": text, "timestamp": 0},
+                    {"sender": "user", "text": data["reply"], "timestamp": 0},
+                ]
+
+        intelligence = data["extractedIntelligence"]
+        self.assertIn("+919876543210", intelligence["phoneNumbers"])
+        self.assertIn("fraud@ybl", intelligence["upiIds"])
+
+
+if __name__ == "__main__":
+    unittest.main()